@@ -1,13 +1,16 @@
 import streamlit as st
-import pandas as pd
 from sqlalchemy.orm import Session
 from database import engine, SessionLocal
 import models
 from portfolio_engine import PortfolioEngine
+from portfolio_cache import PortfolioCache
+import notifications
 # --- התיקון הקריטי: ייבוא כל רכיבי הזמן והמימון ---
 import yfinance as yf
 from datetime import datetime, date, timedelta 
 import market_data 
+import quote_archive
+import screener
 # --------------------------------------------------
 
 # --- יצירת טבלאות (למקרה שנמחקו) ---
@@ -16,12 +19,17 @@ models.Base.metadata.create_all(bind=engine)
 # --- הגדרות עמוד ---
 st.set_page_config(page_title="The Admiral", layout="wide", page_icon="⚓")
 
+# כל כמה שניות סשן פתוח מצייר מחדש מה-cache (בזיכרון, ללא שאילתות)
+LIVE_REFRESH_SECONDS = 2
+
 # --- פונקציות עזר ---
 def run_full_sync():
     """מריץ את המנוע: חישוב מחדש + משיכת מחירים"""
     with SessionLocal() as db:
         pe = PortfolioEngine(db)
         status = st.empty()
+        status.info("📅 מושך פיצולים ודיבידנדים...")
+        market_data.fetch_and_store_corporate_actions([s.symbol for s in db.query(models.Stock).all()])
         status.info("⏳ מחשב נתונים מחדש...")
         pe.recalculate_positions()
         status.info("☁️ מושך מחירים מ-Yahoo...")
@@ -29,37 +37,23 @@ def run_full_sync():
         status.success("✅ הנתונים מעודכנים!")
         return pe.get_portfolio_summary()
 
+@st.cache_resource
+def get_live_cache():
+    """Cache משותף לכל הסשנים בתהליך, מתעדכן מאירועי שינוי (בלי polling ל-DB)"""
+    # המאזין עולה לפני הטעינה הראשונה, ושולח reset אחרי כל התחברות מחדש
+    notifications.start_listener()
+    return PortfolioCache()
+
 def get_positions_data():
     """שליפת נתוני הפוזיציות המחושבים"""
-    with SessionLocal() as db:
-        if db.query(models.Stock).count() == 0:
-            return pd.DataFrame()
-
-        positions = db.query(models.Position).join(models.Stock).all()
-        data = []
-        for p in positions:
-            data.append({
-                "Symbol": p.stock.symbol,
-                "Qty": p.quantity,
-                "Avg Cost ($)": p.average_cost,
-                "Current ($)": p.current_price,
-                "Value ($)": p.current_value,
-                "Total Cost ($)": p.total_cost,
-                "Profit ($)": p.current_value - p.total_cost,
-                "Profit (%)": ((p.current_value - p.total_cost) / p.total_cost * 100) if p.total_cost > 0 else 0,
-                "Daily Change ($)": p.daily_change,
-                "Daily Change (%)": p.daily_change_percent
-            })
-        return pd.DataFrame(data)
+    return get_live_cache().positions_frame()
 
 def get_db_stocks():
     """שליפת רשימת מניות למילוי תיבת הבחירה"""
-    with SessionLocal() as db:
-        try:
-            stocks = db.query(models.Stock).all()
-            return {s.symbol: s.id for s in stocks}
-        except Exception:
-            return {}
+    try:
+        return get_live_cache().stock_map()
+    except Exception:
+        return {}
 
 # --- ממשק משתמש (UI) ---
 
@@ -75,29 +69,33 @@ with st.sidebar:
 st.title("⚓ The Admiral")
 
 # חישוב מדדים
-try:
-    with SessionLocal() as db:
-        pe = PortfolioEngine(db)
-        summary = pe.get_portfolio_summary()
+# fragment מתרענן מה-cache בזיכרון - כך סשן פתוח רואה שינויים של סשנים אחרים
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_metrics():
+    try:
+        summary = get_live_cache().summary()
 
-    # הוספנו עמודה חמישית לכמות המניות
-    col1, col2, col3, col4, col5 = st.columns(5)
-    col1.metric("שווי תיק כולל", f"${summary['total_value']:,.2f}", f"${summary['daily_change']:,.2f}")
-    col2.metric("עלות השקעה", f"${summary['total_invested']:,.2f}")
-    col3.metric("רווח/הפסד ($)", f"${summary['total_pnl']:,.2f}")
-    col4.metric("תשואה (%)", f"{summary['total_pnl_percent']:.2f}%")
-    col5.metric("מניות בתיק", f"{summary.get('positions_count', 0)}")
+        # הוספנו עמודה חמישית לכמות המניות
+        col1, col2, col3, col4, col5 = st.columns(5)
+        col1.metric("שווי תיק כולל", f"${summary['total_value']:,.2f}", f"${summary['daily_change']:,.2f}")
+        col2.metric("עלות השקעה", f"${summary['total_invested']:,.2f}")
+        col3.metric("רווח/הפסד ($)", f"${summary['total_pnl']:,.2f}")
+        col4.metric("תשואה (%)", f"{summary['total_pnl_percent']:.2f}%")
+        col5.metric("מניות בתיק", f"{summary.get('positions_count', 0)}")
 
-except Exception as e:
-    st.warning("המערכת באתחול. נא לטעון מניות בטאב 'ניהול'.")
+    except Exception as e:
+        st.warning("המערכת באתחול. נא לטעון מניות בטאב 'ניהול'.")
+
+render_metrics()
 
 st.divider()
 
 # טאבים ראשיים
-tab1, tab2, tab3, tab4 = st.tabs(["📊 התיק שלי", "💰 ביצוע פעולה", "🔍 בדיקה חיה", "⚙️ ניהול"])
+tab1, tab2, tab3, tab4, tab5 = st.tabs(["📊 התיק שלי", "💰 ביצוע פעולה", "🔍 בדיקה חיה", "🧮 סורק מניות", "⚙️ ניהול"])
 
 # --- טאב 1: התיק שלי ---
-with tab1:
+@st.fragment(run_every=LIVE_REFRESH_SECONDS)
+def render_positions():
     try:
         df = get_positions_data()
         if not df.empty:
@@ -107,6 +105,7 @@ with tab1:
                     "Avg Cost ($)": st.column_config.NumberColumn(format="$%.2f"),
                     "Current ($)": st.column_config.NumberColumn(format="$%.2f"),
                     "Value ($)": st.column_config.NumberColumn(format="$%.0f"),
+                    "Dividends ($)": st.column_config.NumberColumn(format="$%.2f"),
                     "Profit ($)": st.column_config.NumberColumn(format="$%.0f"),
                     "Profit (%)": st.column_config.NumberColumn(format="%.2f%%"),
                     "Daily Change (%)": st.column_config.NumberColumn(format="%.2f%%"),
@@ -120,6 +119,9 @@ with tab1:
     except Exception as e:
         st.error(f"שגיאה בטעינת הנתונים: {e}")
 
+with tab1:
+    render_positions()
+
 # --- טאב 2: ביצוע פעולה (חכם - משיכת מחיר היסטורי) ---
 with tab2:
     st.header("יומן מסחר")
@@ -139,15 +141,24 @@ with tab2:
         suggested_price = 0.0
         price_source_text = "לא נמצא נתון"
         
+        # כמה מניות של היום שוות מניה אחת ביום העסקה (פיצולים שאחריו)
+        split_factor = 1.0
         if selected_symbol:
+            try:
+                with SessionLocal() as db:
+                    split_factor = PortfolioEngine(db).split_factor_since(stock_map[selected_symbol], trade_date)
+            except Exception:
+                split_factor = 1.0
+
             try:
                 # שימוש ב-timedelta לחישוב טווח של יום אחד
                 end_date = trade_date + timedelta(days=1)
-                df_hist = yf.Ticker(selected_symbol).history(start=trade_date, end=end_date)
+                df_hist = yf.Ticker(selected_symbol).history(start=trade_date, end=end_date, auto_adjust=False)
                 
                 if not df_hist.empty:
-                    suggested_price = float(df_hist.iloc[0]['Open'])
-                    price_source_text = f"שער פתיחה לתאריך {trade_date}"
+                    # Yahoo מחזיר מחירים מותאמים לפיצולים - מחזירים ליחידות של יום העסקה
+                    suggested_price = float(df_hist.iloc[0]['Open']) * split_factor
+                    price_source_text = f"שער פתיחה לתאריך {trade_date} (במחירי אותו יום)"
                 else:
                     info = yf.Ticker(selected_symbol).info
                     suggested_price = info.get('currentPrice', 0.0)
@@ -183,8 +194,10 @@ with tab2:
                         current_pos = db.query(models.Position).filter_by(stock_id=stock_map[selected_symbol]).first()
                         current_qty = current_pos.quantity if current_pos else 0.0
                     
-                    if qty > current_qty:
-                        st.error(f"⛔ שגיאה: יש לך בתיק רק {current_qty} מניות.")
+                    # הפוזיציה שמורה במניות של היום, הכמות שהוקלדה במניות של יום העסקה
+                    available_qty = current_qty / split_factor
+                    if qty > available_qty:
+                        st.error(f"⛔ שגיאה: יש לך בתיק רק {available_qty:g} מניות (ביחידות של {trade_date}).")
                         is_valid = False
                 
                 if is_valid:
@@ -228,8 +241,86 @@ with tab3:
         except:
             st.error("שגיאה במשיכת נתונים")
 
-# --- טאב 4: ניהול ---
+        # מגמת מכפיל מהארכיון (Parquet) - אם המניה כבר אורכבה
+        try:
+            pe = quote_archive.pe_trend(symbols=[t.strip().upper()])
+            if not pe.empty:
+                st.caption("מגמת מכפיל רווח (ארכיון)")
+                st.line_chart(pe.set_index("day")[["trailingPE", "forwardPE"]])
+        except Exception as e:
+            st.warning(f"שגיאה בקריאת הארכיון: {e}")
+
+# --- טאב 4: סורק מניות ---
 with tab4:
+    st.header("סורק מניות")
+
+    try:
+        get_live_cache()  # מפעיל את המאזין - תמונת המצב תיבנה מחדש בסוף כל טעינה
+        snapshot = screener.get_snapshot()
+    except Exception as e:
+        snapshot = None
+        st.error(f"שגיאה בבניית תמונת המצב: {e}")
+
+    if snapshot is None or len(snapshot) == 0:
+        st.info("אין ציטוטים בקטלוג. טען מניות בטאב 'ניהול'.")
+    else:
+        filters = []
+
+        c_cat1, c_cat2 = st.columns(2)
+        with c_cat1:
+            sectors = st.multiselect("סקטור", snapshot.categories("sector"))
+        with c_cat2:
+            recommendations = st.multiselect("המלצה", snapshot.categories("recommendationKey"))
+        if sectors:
+            filters.append(("sector", "in", sectors))
+        if recommendations:
+            filters.append(("recommendationKey", "in", recommendations))
+
+        # טווחי מינימום/מקסימום - שדה ריק משמעו ללא סינון (0 ושליליים הם ערכים חוקיים)
+        # היחידות כפי ש-Yahoo מחזיר: dividendYield באחוזים (3 = 3%) בגרסאות yfinance עדכניות,
+        # revenueGrowth ו-fiftyTwoWeekChange כשבר (0.05 = 5%)
+        range_fields = [
+            ("trailingPE", "מכפיל רווח"),
+            ("forwardPE", "מכפיל רווח עתידי"),
+            ("pegRatio", "PEG"),
+            ("priceToBook", "מכפיל הון"),
+            ("dividendYield", "תשואת דיבידנד (%, 3 = 3%)"),
+            ("revenueGrowth", "צמיחת הכנסות (שבר, 0.05 = 5%)"),
+            ("fiftyTwoWeekChange", "שינוי 52 שבועות (שבר)"),
+            ("marketCap", "שווי שוק ($)"),
+        ]
+        cols = st.columns(len(range_fields))
+        for col, (field, label) in zip(cols, range_fields):
+            with col:
+                st.caption(label)
+                low = st.number_input("מינימום", value=None, key=f"scr_min_{field}")
+                high = st.number_input("מקסימום", value=None, key=f"scr_max_{field}")
+            if low is not None:
+                filters.append((field, ">=", low))
+            if high is not None:
+                filters.append((field, "<=", high))
+
+        c_sort1, c_sort2 = st.columns(2)
+        with c_sort1:
+            sort_by = st.selectbox("מיון לפי", screener.NUMERIC_FIELDS, index=screener.NUMERIC_FIELDS.index("marketCap"))
+        with c_sort2:
+            ascending = st.toggle("סדר עולה", value=False)
+
+        result = screener.screen(filters, sort_by=sort_by, ascending=ascending)
+        st.caption(f"{len(result)} מתוך {len(snapshot)} מניות · תמונת מצב מ-{snapshot.built_at:%H:%M:%S}")
+        st.dataframe(
+            result[["symbol", "shortName", "sector", "currentPrice", "marketCap", "trailingPE", "forwardPE",
+                    "pegRatio", "priceToBook", "dividendYield", "revenueGrowth", "recommendationKey"]],
+            column_config={
+                "currentPrice": st.column_config.NumberColumn(format="$%.2f"),
+                "marketCap": st.column_config.NumberColumn(format="$%.0f"),
+            },
+            use_container_width=True,
+            hide_index=True,
+        )
+
+# --- טאב 5: ניהול ---
+with tab5:
     st.header("מערכת ניהול קטלוג")
     
     tickers_input = st.text_area("הכנס רשימת מניות (מופרדות בפסיק)", "AAPL, MSFT, TSLA, GOOGL, NVDA")
@@ -252,9 +343,25 @@ with tab4:
                 
                 progress_bar.progress((i + 1) / len(t_list))
             
+            status_text.text("מושך פיצולים ודיבידנדים...")
+            market_data.fetch_and_store_corporate_actions(t_list)
+            notifications.publish("ingestion_complete", symbols=t_list)
+            
             status_text.success("✅ המניות נטענו בהצלחה!")
             st.rerun()
             
+    st.divider()
+    st.subheader("📦 ארכיון Parquet")
+
+    if st.button("📦 ארכב ציטוטים ונרות יומיים"):
+        with st.spinner("כותב לארכיון..."):
+            try:
+                quote_archive.export_quotes()
+                quote_archive.export_daily_bars(list(get_db_stocks().keys()))
+                st.success("✅ הארכיון עודכן!")
+            except Exception as e:
+                st.error(f"שגיאה בארכוב: {e}")
+
     st.divider()
     st.subheader("⚠️ אזור סכנה")
     
@@ -264,6 +371,7 @@ with tab4:
                 db.query(models.Position).delete()
                 db.query(models.Transaction).delete()
                 db.commit()
+            notifications.publish("reset")
             
             st.success("הנתונים נמחקו בהצלחה! המערכת נקייה.")
             run_full_sync()
@@ -4,6 +4,7 @@ import pandas as pd
 from sqlalchemy.orm import Session
 from database import SessionLocal, engine
 import models
+import notifications
 
 def sanitize_value(val):
     """פונקציית עזר לניקוי נתונים: הופכת 'None' או ערכים ריקים ל-None של פייתון"""
@@ -114,6 +115,7 @@ def fetch_and_store_data(symbol: str):
         db.add(quote)
         db.commit()
         print(f"✅ Data saved successfully for {symbol}")
+        notifications.publish("quote", stock_id=stock.id, symbol=symbol, price=quote.currentPrice)
 
     except Exception as e:
         print(f"❌ Database Error for {symbol}: {e}")
@@ -121,6 +123,70 @@ def fetch_and_store_data(symbol: str):
     finally:
         db.close()
 
+def rebuild_adjustment_factors(db: Session, stock_id: int):
+    """
+    בונה מחדש את סדרת מקדמי ההתאמה המצטברים של מניה מתוך טבלת הפיצולים.
+    """
+    splits = db.query(models.CorporateAction)\
+        .filter(models.CorporateAction.stock_id == stock_id,
+                models.CorporateAction.type == 'SPLIT')\
+        .order_by(models.CorporateAction.date.asc())\
+        .all()
+
+    db.query(models.AdjustmentFactor).filter_by(stock_id=stock_id).delete()
+
+    cumulative = 1.0
+    for split in splits:
+        cumulative *= split.value
+        db.add(models.AdjustmentFactor(stock_id=stock_id, date=split.date, split_factor=cumulative))
+
+def fetch_and_store_corporate_actions(symbols):
+    """
+    טעינת פיצולים ודיבידנדים מ-Yahoo לכל המניות ברשימה, ובניית מקדמי ההתאמה.
+    Yahoo מחזיר את כל ההיסטוריה, לכן מחליפים את האירועים של כל מניה במלואם.
+    """
+    if not symbols:
+        return
+
+    print(f"⚓ Fetching corporate actions for: {', '.join(symbols)}...")
+    data = yf.Tickers(" ".join(symbols))
+
+    db: Session = SessionLocal()
+
+    try:
+        stocks = db.query(models.Stock).filter(models.Stock.symbol.in_(symbols)).all()
+
+        for stock in stocks:
+            try:
+                actions = data.tickers[stock.symbol].actions
+            except Exception as e:
+                print(f"❌ Error fetching corporate actions for {stock.symbol}: {e}")
+                continue
+
+            db.query(models.CorporateAction).filter_by(stock_id=stock.id).delete()
+
+            if actions is not None and not actions.empty:
+                for ts, row in actions.iterrows():
+                    split_ratio = sanitize_value(row.get('Stock Splits'))
+                    dividend = sanitize_value(row.get('Dividends'))
+
+                    if split_ratio:
+                        db.add(models.CorporateAction(stock_id=stock.id, date=ts.date(), type='SPLIT', value=split_ratio))
+                    if dividend:
+                        db.add(models.CorporateAction(stock_id=stock.id, date=ts.date(), type='DIVIDEND', value=dividend))
+
+            db.flush()
+            rebuild_adjustment_factors(db, stock.id)
+
+        db.commit()
+        print("✅ Corporate actions saved.")
+
+    except Exception as e:
+        print(f"❌ Database Error while saving corporate actions: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
 if __name__ == "__main__":
     # רשימת מניות לדוגמה
     tickers = ["AAPL", "TSLA", "NVDA", "MSFT", "GOOGL"]
@@ -128,4 +194,6 @@ if __name__ == "__main__":
     print("🚀 Starting Data Update...")
     for t in tickers:
         fetch_and_store_data(t)
+    fetch_and_store_corporate_actions(tickers)
+    notifications.publish("ingestion_complete", symbols=tickers)
     print("🏁 Update Complete.")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, BigInteger, Text, Boolean, DateTime
+from sqlalchemy import Column, Integer, String, Float, Date, ForeignKey, BigInteger, Text, Boolean, DateTime, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -42,6 +42,12 @@ class Stock(Base):
     # הקשר לפוזיציה (One-to-One)
     position = relationship("Position", uselist=False, back_populates="stock", cascade="all, delete-orphan")
 
+    corporate_actions = relationship("CorporateAction", back_populates="stock", cascade="all, delete-orphan")
+
+    adjustment_factors = relationship("AdjustmentFactor", back_populates="stock", cascade="all, delete-orphan")
+
+    dividend_income = relationship("DividendIncome", uselist=False, back_populates="stock", cascade="all, delete-orphan")
+
 
 class StockQuote(Base):
     """
@@ -140,4 +146,56 @@ class Position(Base):
 
     # --- התיקון הקריטי ---
     # השורה הזו הייתה חסרה כנראה, או לא תאמה לשם שהוגדר ב-Stock
-    stock = relationship("Stock", back_populates="position")
\ No newline at end of file
+    stock = relationship("Stock", back_populates="position")
+
+
+class CorporateAction(Base):
+    """
+    טבלת אירועי תאגיד: פיצולים ודיבידנדים כפי שמגיעים מ-Yahoo.
+    SPLIT -> value הוא יחס הפיצול (4.0 = פיצול 1:4)
+    DIVIDEND -> value הוא הסכום למניה (מותאם לפיצולים, כמו ב-Yahoo)
+    """
+    __tablename__ = "corporate_actions"
+    __table_args__ = (UniqueConstraint("stock_id", "date", "type"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), index=True)
+
+    date = Column(Date, nullable=False)
+    type = Column(String, nullable=False)
+    value = Column(Float, nullable=False)
+
+    stock = relationship("Stock", back_populates="corporate_actions")
+
+
+class AdjustmentFactor(Base):
+    """
+    טבלת מקדמי התאמה מחושבים מראש: לכל תאריך פיצול, המכפלה המצטברת
+    של כל הפיצולים עד אותו תאריך (כולל). נבנית מחדש אחרי כל טעינת אירועים.
+    """
+    __tablename__ = "adjustment_factors"
+    __table_args__ = (UniqueConstraint("stock_id", "date"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), index=True)
+
+    date = Column(Date, nullable=False)
+    split_factor = Column(Float, nullable=False)
+
+    stock = relationship("Stock", back_populates="adjustment_factors")
+
+
+class DividendIncome(Base):
+    """
+    טבלת הכנסות מדיבידנד: הסכום המצטבר לכל מניה.
+    נפרדת מ-Positions כדי שההכנסה תישמר גם אחרי שהפוזיציה נסגרה.
+    """
+    __tablename__ = "dividend_income"
+
+    id = Column(Integer, primary_key=True, index=True)
+    stock_id = Column(Integer, ForeignKey("stocks.id"), unique=True)
+
+    amount = Column(Float, default=0.0)
+    last_updated = Column(DateTime(timezone=True), server_default=func.now())
+
+    stock = relationship("Stock", back_populates="dividend_income")
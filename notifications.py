@@ -0,0 +1,181 @@
+import json
+import os
+import select
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import closing
+from sqlalchemy import text
+from database import engine
+
+# ערוץ השינויים המשותף לכל התהליכים (LISTEN/NOTIFY ב-Postgres)
+CHANNEL = "admiral_changes"
+
+# מזהה התהליך הנוכחי - כדי לא לעבד פעמיים אירועים שאנחנו עצמנו שלחנו
+PROCESS_ID = uuid.uuid4().hex[:12]
+
+# גיבוי מקומי (SQLite / קובץ) כשאין Postgres
+LOCAL_EVENTS_PATH = os.getenv("ADMIRAL_EVENTS_DB", os.path.join(tempfile.gettempdir(), "admiral_events.sqlite"))
+LOCAL_POLL_SECONDS = 1.0
+LOCAL_RETENTION_SECONDS = 3600
+
+# Postgres מגביל payload ל-8000 בתים (משאירים מרווח)
+MAX_PAYLOAD_BYTES = 7900
+
+_handlers = []
+_handlers_lock = threading.Lock()
+_listener = None
+
+
+def _use_postgres():
+    return engine.dialect.name == "postgresql"
+
+
+def subscribe(handler):
+    """רישום פונקציה שתקבל כל אירוע שינוי (dict) - מהתהליך הזה ומתהליכים אחרים"""
+    with _handlers_lock:
+        _handlers.append(handler)
+
+
+def _dispatch(event):
+    with _handlers_lock:
+        handlers = list(_handlers)
+    for handler in handlers:
+        try:
+            handler(event)
+        except Exception as e:
+            print(f"❌ Change handler failed for {event.get('type')}: {e}")
+
+
+def _split_for_notify(event):
+    """
+    מפצל אירוע גדול מדי לכמה אירועים לפי שדה הרשימה שלו (stock_ids / items / symbols).
+    אם אי אפשר לפצל - שולחים reset, כדי שהמאזינים יטענו מחדש ולא יפספסו את השינוי.
+    """
+    if len(json.dumps(event).encode("utf-8")) <= MAX_PAYLOAD_BYTES:
+        return [event]
+
+    list_fields = [key for key, value in event.items() if isinstance(value, list)]
+    if len(list_fields) != 1 or len(event[list_fields[0]]) < 2:
+        return [{"type": "reset", "src": event["src"]}]
+
+    key = list_fields[0]
+    values = event[key]
+    middle = len(values) // 2
+    return _split_for_notify(dict(event, **{key: values[:middle]})) + \
+        _split_for_notify(dict(event, **{key: values[middle:]}))
+
+
+def publish(event_type, **payload):
+    """
+    שליחת אירוע שינוי קומפקטי. נקרא אחרי commit, כך שהמאזינים יראו נתונים מעודכנים.
+    """
+    event = dict(payload, type=event_type, src=PROCESS_ID)
+
+    # קודם מעדכנים את התהליך הנוכחי (סינכרוני, האירוע המלא), ואז את השאר
+    _dispatch(event)
+    try:
+        if _use_postgres():
+            with engine.begin() as conn:
+                for part in _split_for_notify(event):
+                    conn.execute(text("SELECT pg_notify(:channel, :payload)"),
+                                 {"channel": CHANNEL, "payload": json.dumps(part)})
+        else:
+            _local_publish(event)
+    except Exception as e:
+        print(f"❌ Failed to publish change event {event_type}: {e}")
+
+
+# --- גיבוי מקומי ---
+
+def _local_connect():
+    conn = sqlite3.connect(LOCAL_EVENTS_PATH, timeout=5)
+    conn.execute("CREATE TABLE IF NOT EXISTS events (id INTEGER PRIMARY KEY AUTOINCREMENT, created REAL, payload TEXT)")
+    return conn
+
+
+def _local_publish(event):
+    with closing(_local_connect()) as conn, conn:
+        now = time.time()
+        conn.execute("INSERT INTO events (created, payload) VALUES (?, ?)", (now, json.dumps(event)))
+        conn.execute("DELETE FROM events WHERE created < ?", (now - LOCAL_RETENTION_SECONDS,))
+
+
+# --- מאזין ---
+
+class ChangeListener(threading.Thread):
+    """
+    Thread רקע (אחד לתהליך) שמקבל אירועים מתהליכים אחרים ומעביר אותם ל-handlers.
+    """
+
+    def __init__(self):
+        super().__init__(daemon=True, name="admiral-change-listener")
+
+    def run(self):
+        while True:
+            try:
+                if _use_postgres():
+                    self._listen_postgres()
+                else:
+                    self._listen_local()
+            except Exception as e:
+                print(f"Change listener disconnected, retrying... Error: {e}")
+                time.sleep(2)
+
+    def _resync(self):
+        # אירועים שנשלחו לפני שהתחלנו להאזין (או בזמן ניתוק) אבדו - טעינה מלאה
+        _dispatch({"type": "reset", "src": PROCESS_ID})
+
+    def _handle(self, raw):
+        try:
+            event = json.loads(raw)
+        except ValueError:
+            return
+        if event.get("src") != PROCESS_ID:
+            _dispatch(event)
+
+    def _listen_postgres(self):
+        import psycopg2
+
+        dsn = engine.url.set(drivername="postgresql").render_as_string(hide_password=False)
+        conn = psycopg2.connect(dsn)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        try:
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+            self._resync()
+            while True:
+                # חוסם עד שמגיעה הודעה - אין פניות חוזרות ל-DB
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    self._handle(conn.notifies.pop(0).payload)
+        finally:
+            conn.close()
+
+    def _listen_local(self):
+        with closing(_local_connect()) as conn:
+            row = conn.execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()
+        last_id = row[0]
+        self._resync()
+
+        while True:
+            time.sleep(LOCAL_POLL_SECONDS)
+            with closing(_local_connect()) as conn:
+                rows = conn.execute("SELECT id, payload FROM events WHERE id > ? ORDER BY id", (last_id,)).fetchall()
+            for event_id, raw in rows:
+                last_id = event_id
+                self._handle(raw)
+
+
+def start_listener():
+    """מפעיל את המאזין פעם אחת לכל תהליך"""
+    global _listener
+    with _handlers_lock:
+        if _listener is None:
+            _listener = ChangeListener()
+            _listener.start()
+    return _listener
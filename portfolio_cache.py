@@ -0,0 +1,152 @@
+import threading
+from types import SimpleNamespace
+import pandas as pd
+from database import SessionLocal
+import models
+import notifications
+from portfolio_engine import PortfolioEngine
+
+POSITION_FIELDS = (
+    "quantity", "average_cost", "total_cost", "current_price", "current_value",
+    "daily_change", "daily_change_percent",
+)
+
+
+class PortfolioCache:
+    """
+    Cache משותף לכל הסשנים בתהליך: נטען פעם אחת מה-DB ומתעדכן מאירועי השינוי
+    (notifications) במקום לשלוף הכל מחדש בכל rerun של Streamlit.
+    version עולה בכל שינוי - הסיכום והטבלה מחושבים מחדש רק כשהוא משתנה.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._positions = {}
+        self._dividends = {}
+        self._stocks = {}
+        self._rendered = {}
+        self.version = 0
+
+        # קודם נרשמים ואז טוענים: אירוע שמגיע בזמן הטעינה ממתין למנעול ומוחל אחריה
+        notifications.subscribe(self.apply)
+        self.reload()
+
+    # --- טעינה מה-DB ---
+
+    def reload(self):
+        with self._lock, SessionLocal() as db:
+            stocks = {s.symbol: s.id for s in db.query(models.Stock).all()}
+            positions = {p.stock_id: self._snapshot(p) for p in db.query(models.Position).join(models.Stock).all()}
+            dividends = {d.stock_id: d.amount or 0.0 for d in db.query(models.DividendIncome).all()}
+
+            self._stocks = stocks
+            self._positions = positions
+            self._dividends = dividends
+            self.version += 1
+
+    def _reload_positions(self, stock_ids):
+        with SessionLocal() as db:
+            rows = db.query(models.Position).join(models.Stock)\
+                .filter(models.Position.stock_id.in_(stock_ids))\
+                .all()
+            fresh = {p.stock_id: self._snapshot(p) for p in rows}
+            dividends = {d.stock_id: d.amount or 0.0 for d in db.query(models.DividendIncome)
+                         .filter(models.DividendIncome.stock_id.in_(stock_ids)).all()}
+
+        with self._lock:
+            for stock_id in stock_ids:
+                if stock_id in fresh:
+                    self._positions[stock_id] = fresh[stock_id]
+                else:
+                    self._positions.pop(stock_id, None)
+                if stock_id in dividends:
+                    self._dividends[stock_id] = dividends[stock_id]
+                else:
+                    self._dividends.pop(stock_id, None)
+
+    def _reload_stocks(self):
+        with SessionLocal() as db:
+            stocks = {s.symbol: s.id for s in db.query(models.Stock).all()}
+        with self._lock:
+            self._stocks = stocks
+
+    @staticmethod
+    def _snapshot(position):
+        """עותק מנותק מה-session של שורת Position"""
+        values = {field: getattr(position, field) or 0.0 for field in POSITION_FIELDS}
+        return SimpleNamespace(stock_id=position.stock_id, symbol=position.stock.symbol, **values)
+
+    # --- החלת אירועי שינוי ---
+
+    def apply(self, event):
+        event_type = event.get("type")
+
+        with self._lock:
+            if event_type == "positions":
+                self._reload_positions(event["stock_ids"])
+
+            elif event_type == "prices":
+                # המחירים מגיעים באירוע עצמו - אין צורך בשאילתה
+                for item in event["items"]:
+                    position = self._positions.get(item["stock_id"])
+                    if position:
+                        for field, value in item.items():
+                            if field != "stock_id":
+                                setattr(position, field, value)
+
+            elif event_type == "quote":
+                if event.get("symbol") not in self._stocks:
+                    self._reload_stocks()
+
+            elif event_type == "reset":
+                self.reload()
+                return
+
+            else:
+                return
+
+            self.version += 1
+
+    # --- קריאה לדשבורד ---
+
+    def stock_map(self):
+        with self._lock:
+            return dict(self._stocks)
+
+    def _memoized(self, name, build):
+        """מחזיר את התוצאה האחרונה אם ה-version לא השתנה מאז שחושבה"""
+        with self._lock:
+            version, value = self._rendered.get(name, (None, None))
+            if version != self.version:
+                value = build()
+                self._rendered[name] = (self.version, value)
+            return value
+
+    def summary(self):
+        return self._memoized("summary", lambda: PortfolioEngine.summarize(
+            list(self._positions.values()), sum(self._dividends.values())))
+
+    def positions_frame(self):
+        return self._memoized("positions", self._build_positions_frame)
+
+    def _build_positions_frame(self):
+        positions = sorted(self._positions.values(), key=lambda p: p.symbol)
+        dividends = self._dividends
+
+        data = []
+        for p in positions:
+            dividend_income = dividends.get(p.stock_id, 0.0)
+            data.append({
+                "Symbol": p.symbol,
+                "Qty": p.quantity,
+                "Avg Cost ($)": p.average_cost,
+                "Current ($)": p.current_price,
+                "Value ($)": p.current_value,
+                "Total Cost ($)": p.total_cost,
+                "Dividends ($)": dividend_income,
+                "Profit ($)": p.current_value - p.total_cost + dividend_income,
+                "Profit (%)": ((p.current_value - p.total_cost + dividend_income) / p.total_cost * 100) if p.total_cost > 0 else 0,
+                "Daily Change ($)": p.daily_change,
+                "Daily Change (%)": p.daily_change_percent
+            })
+        return pd.DataFrame(data)
@@ -1,8 +1,10 @@
 import yfinance as yf
+import numpy as np
 from sqlalchemy.orm import Session
 from sqlalchemy import func
 from datetime import datetime
 import models
+import notifications
 from database import SessionLocal
 
 class PortfolioEngine:
@@ -13,11 +15,15 @@ class PortfolioEngine:
     def recalculate_positions(self):
         """
         משחזר את ההיסטוריה: עובר על כל העסקאות ומחשב כמות וממוצע.
+        הכמויות מותאמות לפיצולים, והכנסות מדיבידנד מחושבות לפי ההחזקה ביום האקס.
         """
         print("🔄 Engine: Recalculating all positions...")
         
-        # 1. שליפת כל המניות
+        # 1. שליפת כל המניות + אירועי התאגיד בשאילתה אחת לכל טבלה
         stocks = self.db.query(models.Stock).all()
+        factors_map = self._load_adjustment_factors()
+        dividends_map = self._load_dividends()
+        changed_ids = []
         
         for stock in stocks:
             # שליפת עסקאות למניה זו, ממוינות מהישן לחדש
@@ -27,33 +33,123 @@ class PortfolioEngine:
                 .all()
             
             if not transactions:
-                self._delete_position(stock.id)
+                deleted = self._delete_position(stock.id)
+                if self._set_dividend_income(stock.id, 0.0) or deleted:
+                    changed_ids.append(stock.id)
                 continue
 
+            # --- התאמה לפיצולים (וקטורית) ---
+            tx_dates = np.array([tx.date for tx in transactions], dtype='datetime64[D]')
+            factor_dates, factors = factors_map.get(stock.id, (None, None))
+            adjustment = self._split_adjustment(tx_dates, factor_dates, factors)
+            adjusted_qty = np.array([tx.quantity for tx in transactions]) * adjustment
+
             # --- לוגיקת החישוב (זהה ל-Dart) ---
             total_quantity = 0.0
             total_cost = 0.0
+            holdings_after = np.empty(len(transactions))
             
-            for tx in transactions:
+            for i, (tx, qty) in enumerate(zip(transactions, adjusted_qty)):
                 if tx.type == 'BUY':
-                    total_quantity += tx.quantity
+                    total_quantity += qty
                     total_cost += tx.total_amount 
                     
                 elif tx.type == 'SELL':
                     if total_quantity > 0:
                         avg_cost = total_cost / total_quantity
-                        total_quantity -= tx.quantity
+                        total_quantity -= qty
                         total_cost = total_quantity * avg_cost
                     else:
                         total_quantity = 0
                         total_cost = 0
 
+                holdings_after[i] = total_quantity
+
+            # --- דיבידנדים ---
+            # נשמר בטבלה נפרדת - גם פוזיציה סגורה ממשיכה להיספר ברווח
+            dividend_income = self._dividend_income(tx_dates, holdings_after, dividends_map.get(stock.id))
+            income_changed = self._set_dividend_income(stock.id, dividend_income)
+
             # --- שמירה ל-DB ---
             if total_quantity > 0.0001: 
                 avg_cost = total_cost / total_quantity
                 self._update_position_record(stock, total_quantity, avg_cost, total_cost)
-            else:
-                self._delete_position(stock.id)
+                changed_ids.append(stock.id)
+            elif self._delete_position(stock.id) or income_changed:
+                changed_ids.append(stock.id)
+
+        if changed_ids:
+            notifications.publish("positions", stock_ids=changed_ids)
+
+    def _load_adjustment_factors(self):
+        """stock_id -> (תאריכים, מקדמים מצטברים) מתוך הטבלה המחושבת מראש"""
+        rows = self.db.query(models.AdjustmentFactor)\
+            .order_by(models.AdjustmentFactor.stock_id, models.AdjustmentFactor.date.asc())\
+            .all()
+        return self._group_series(rows, lambda r: r.split_factor)
+
+    def _load_dividends(self):
+        """stock_id -> (תאריכי אקס, סכום למניה)"""
+        rows = self.db.query(models.CorporateAction)\
+            .filter(models.CorporateAction.type == 'DIVIDEND')\
+            .order_by(models.CorporateAction.stock_id, models.CorporateAction.date.asc())\
+            .all()
+        return self._group_series(rows, lambda r: r.value)
+
+    @staticmethod
+    def _group_series(rows, value_of):
+        grouped = {}
+        for row in rows:
+            dates, values = grouped.setdefault(row.stock_id, ([], []))
+            dates.append(row.date)
+            values.append(value_of(row))
+        return {
+            stock_id: (np.array(dates, dtype='datetime64[D]'), np.array(values, dtype=float))
+            for stock_id, (dates, values) in grouped.items()
+        }
+
+    def split_factor_since(self, stock_id, on_date):
+        """
+        מקדם ההמרה ממניות בתאריך on_date למניות של היום (מכפלת הפיצולים שאחריו).
+        כמות של היום / המקדם = כמות ביחידות של יום העסקה.
+        """
+        rows = self.db.query(models.AdjustmentFactor)\
+            .filter(models.AdjustmentFactor.stock_id == stock_id)\
+            .order_by(models.AdjustmentFactor.date.asc())\
+            .all()
+        factor_dates = np.array([r.date for r in rows], dtype='datetime64[D]')
+        factors = np.array([r.split_factor for r in rows], dtype=float)
+        on_dates = np.array([on_date], dtype='datetime64[D]')
+        return float(self._split_adjustment(on_dates, factor_dates, factors)[0])
+
+    @staticmethod
+    def _split_adjustment(tx_dates, factor_dates, factors):
+        """
+        מקדם ההמרה של כל עסקה ליחידות של היום: המקדם המצטבר הכולל
+        חלקי המקדם המצטבר בתאריך העסקה (עסקה ביום הפיצול כבר במחיר החדש).
+        """
+        if factors is None or len(factors) == 0:
+            return np.ones(len(tx_dates))
+        idx = np.searchsorted(factor_dates, tx_dates, side='right')
+        cumulative = np.concatenate(([1.0], factors))[idx]
+        return factors[-1] / cumulative
+
+    @staticmethod
+    def _dividend_income(tx_dates, holdings_after, dividends):
+        """
+        סכום הדיבידנדים: כמות המניות שהוחזקה לפני כל יום אקס כפול הסכום למניה.
+        holdings_after - הכמות אחרי כל עסקה, כפי שחושבה בלולאת השחזור,
+        כך שהפוזיציה והדיבידנד נשענים על אותה היסטוריית החזקה.
+        הכמויות והדיבידנדים שניהם ביחידות מותאמות לפיצולים.
+        """
+        if dividends is None:
+            return 0.0
+        ex_dates, amounts = dividends
+
+        holdings = np.concatenate(([0.0], holdings_after))
+        held = holdings[np.searchsorted(tx_dates, ex_dates, side='left')]
+
+        return float(np.sum(np.clip(held, 0.0, None) * amounts))
 
     def _update_position_record(self, stock, quantity, avg_cost, total_cost):
         """עדכון או יצירת שורה בטבלת Positions"""
@@ -78,6 +174,30 @@ class PortfolioEngine:
         if position:
             self.db.delete(position)
             self.db.commit()
+            return True
+        return False
+
+    def _set_dividend_income(self, stock_id, amount):
+        """עדכון ההכנסה המצטברת מדיבידנד. מחזיר True אם משהו השתנה"""
+        record = self.db.query(models.DividendIncome).filter_by(stock_id=stock_id).first()
+
+        if amount <= 0:
+            if not record:
+                return False
+            self.db.delete(record)
+            self.db.commit()
+            return True
+
+        if record and record.amount == amount:
+            return False
+        if not record:
+            record = models.DividendIncome(stock_id=stock_id)
+            self.db.add(record)
+
+        record.amount = amount
+        record.last_updated = datetime.now()
+        self.db.commit()
+        return True
 
     def refresh_prices(self):
         """משיכת מחירים מ-Yahoo ועדכון השווי"""
@@ -94,6 +214,7 @@ class PortfolioEngine:
         try:
             tickers_str = " ".join(tickers_list)
             data = yf.Tickers(tickers_str)
+            updated = []
             
             for symbol, position in tickers_map.items():
                 try:
@@ -110,6 +231,7 @@ class PortfolioEngine:
                         position.daily_change = change * position.quantity
                         position.daily_change_percent = change_pct
                         position.last_updated = datetime.now()
+                        updated.append(position)
                         
                 except Exception as e:
                     print(f"Error updating {symbol}: {e}")
@@ -117,17 +239,34 @@ class PortfolioEngine:
             self.db.commit()
             print("✅ Prices updated.")
             
+            if updated:
+                notifications.publish("prices", items=[{
+                    "stock_id": p.stock_id,
+                    "current_price": p.current_price,
+                    "current_value": p.current_value,
+                    "daily_change": p.daily_change,
+                    "daily_change_percent": p.daily_change_percent
+                } for p in updated])
+            
         except Exception as e:
             print(f"❌ Batch price fetch failed: {e}")
 
     def get_portfolio_summary(self):
         """חישוב סיכומים לדשבורד"""
         positions = self.db.query(models.Position).all()
-        
+        total_dividends = self.db.query(func.sum(models.DividendIncome.amount)).scalar() or 0.0
+        return self.summarize(positions, total_dividends)
+
+    @staticmethod
+    def summarize(positions, total_dividends=0.0):
+        """
+        סיכומים מתוך רשימת פוזיציות (רשומות DB או עותקים מה-cache).
+        total_dividends כולל גם דיבידנדים של פוזיציות שכבר נסגרו.
+        """
         total_market_value = sum(p.current_value for p in positions)
         total_cost_basis = sum(p.total_cost for p in positions)
         
-        total_pnl = total_market_value - total_cost_basis
+        total_pnl = total_market_value - total_cost_basis + total_dividends
         total_pnl_percent = (total_pnl / total_cost_basis * 100) if total_cost_basis > 0 else 0
         
         daily_change_amount = sum(p.daily_change for p in positions)
@@ -137,7 +276,9 @@ class PortfolioEngine:
             "total_invested": total_cost_basis,
             "total_pnl": total_pnl,
             "total_pnl_percent": total_pnl_percent,
-            "daily_change": daily_change_amount
+            "total_dividends": total_dividends,
+            "daily_change": daily_change_amount,
+            "positions_count": len(positions)
         }
 
 # --- בדיקה מהירה ---
@@ -0,0 +1,282 @@
+import os
+from urllib.parse import unquote
+from datetime import date, datetime, time, timedelta, timezone
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.fs as pafs
+import yfinance as yf
+from sqlalchemy import BigInteger, Float, select
+from database import SessionLocal, engine
+import models
+
+# ארכיון עמודתי (Parquet) של היסטוריית הציטוטים - לניתוחים על כל הקטלוג בלי לסרוק את Postgres
+ARCHIVE_DIR = os.getenv("ADMIRAL_ARCHIVE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "archive"))
+QUOTES_DIR = os.path.join(ARCHIVE_DIR, "quotes")
+BARS_DIR = os.path.join(ARCHIVE_DIR, "bars")
+
+# ציטוטים: מחיצה לפי יום + סימול. נרות יומיים: לפי שנה + סימול (אחרת קובץ זעיר לכל יום)
+QUOTES_PARTITIONING = ds.partitioning(pa.schema([("date", pa.string()), ("symbol", pa.string())]), flavor="hive")
+BARS_PARTITIONING = ds.partitioning(pa.schema([("year", pa.string()), ("symbol", pa.string())]), flavor="hive")
+
+BARS_SCHEMA = pa.schema([
+    ("day", pa.date32()),
+    ("open", pa.float64()),
+    ("high", pa.float64()),
+    ("low", pa.float64()),
+    ("close", pa.float64()),
+    ("adj_close", pa.float64()),
+    ("volume", pa.int64()),
+    ("year", pa.string()),
+    ("symbol", pa.string()),
+])
+
+# קריאה ממופת-זיכרון: Arrow קורא רק את העמודות והמחיצות הנדרשות
+_filesystem = pafs.LocalFileSystem(use_mmap=True)
+
+
+def _quote_columns():
+    """עמודות הנתונים של StockQuote (ללא מפתחות)"""
+    return [c for c in models.StockQuote.__table__.columns if c.name not in ("id", "stock_id")]
+
+
+def _quotes_schema():
+    fields = []
+    for column in _quote_columns():
+        if column.name == "timestamp":
+            fields.append((column.name, pa.timestamp("us", tz="UTC")))
+        elif isinstance(column.type, BigInteger):
+            fields.append((column.name, pa.int64()))
+        elif isinstance(column.type, Float):
+            fields.append((column.name, pa.float64()))
+        else:
+            fields.append((column.name, pa.string()))
+    return pa.schema(fields + [("date", pa.string()), ("symbol", pa.string())])
+
+
+def _latest_archived_days():
+    """symbol -> היום האחרון שנשמר עבורו בארכיון (לפי שמות המחיצות, בלי לקרוא קבצים)"""
+    latest = {}
+    for day in _archived_days():
+        for name in os.listdir(os.path.join(QUOTES_DIR, f"date={day}")):
+            if name.startswith("symbol="):
+                latest[unquote(name.split("=", 1)[1])] = day
+    return latest
+
+
+def _archived_days():
+    if not os.path.isdir(QUOTES_DIR):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(QUOTES_DIR) if name.startswith("date="))
+
+
+# --- ייצוא / דחיסה ---
+
+def export_quotes(start_date: date = None, end_date: date = None):
+    """
+    מייצא את stock_quotes לארכיון, יום אחר יום. כל יום נכתב מחדש במלואו
+    (קובץ אחד לכל יום+סימול), כך שהרצה חוזרת גם דוחסת את המחיצה.
+    ברירת מחדל: מהיום האחרון שנשמר (אולי היה חלקי) ועד היום.
+    """
+    end_date = end_date or date.today()
+    if start_date is None:
+        days = _archived_days()
+        if days:
+            start_date = date.fromisoformat(days[-1])
+        else:
+            with SessionLocal() as db:
+                first = db.query(models.StockQuote.timestamp).order_by(models.StockQuote.timestamp.asc()).first()
+            if not first:
+                print("No quotes to archive.")
+                return
+            start_date = first[0].date()
+
+    print(f"📦 Archiving quotes {start_date} → {end_date}...")
+    schema = _quotes_schema()
+    columns = [getattr(models.StockQuote, c.name) for c in _quote_columns()]
+
+    day = start_date
+    while day <= end_date:
+        day_start = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        query = select(models.Stock.symbol, *columns)\
+            .join(models.Stock, models.Stock.id == models.StockQuote.stock_id)\
+            .where(models.StockQuote.timestamp >= day_start,
+                   models.StockQuote.timestamp < day_start + timedelta(days=1))
+
+        df = pd.read_sql(query, engine)
+        if not df.empty:
+            df["timestamp"] = pd.to_datetime(df["timestamp"], utc=True)
+            df["date"] = day.isoformat()
+            table = pa.Table.from_pandas(df, schema=schema, preserve_index=False)
+            ds.write_dataset(
+                table, QUOTES_DIR, format="parquet",
+                partitioning=QUOTES_PARTITIONING,
+                existing_data_behavior="delete_matching",
+                basename_template="part-{i}.parquet",
+            )
+            print(f"   {day}: {len(df)} rows")
+        day += timedelta(days=1)
+
+    print("✅ Quotes archived.")
+
+
+def export_daily_bars(symbols, period: str = "1y"):
+    """
+    מושך נרות יומיים מ-Yahoo בבקשה אחת לכל הרשימה ומאחד אותם עם הארכיון הקיים.
+    """
+    if not symbols:
+        return
+
+    print(f"📦 Archiving daily bars for: {', '.join(symbols)}...")
+    raw = yf.download(symbols, period=period, group_by="ticker", auto_adjust=False, actions=False, progress=False)
+    if raw.empty:
+        print("No bars returned.")
+        return
+
+    frames = []
+    for symbol in symbols:
+        try:
+            bars = raw[symbol] if isinstance(raw.columns, pd.MultiIndex) else raw
+        except KeyError:
+            continue
+        bars = bars.dropna(how="all").reset_index()
+        if bars.empty:
+            continue
+        frames.append(pd.DataFrame({
+            "day": pd.to_datetime(bars["Date"]).dt.date,
+            "open": bars["Open"],
+            "high": bars["High"],
+            "low": bars["Low"],
+            "close": bars["Close"],
+            "adj_close": bars["Adj Close"],
+            "volume": bars["Volume"],
+            "symbol": symbol,
+        }))
+
+    if not frames:
+        return
+
+    new_bars = pd.concat(frames, ignore_index=True)
+    new_bars["year"] = new_bars["day"].map(lambda d: str(d.year))
+
+    # דחיסה: מחיצות (שנה, סימול) שנוגעים בהן נכתבות מחדש עם הישן + החדש
+    existing = read_bars(symbols=symbols, years=sorted(new_bars["year"].unique()))
+    if not existing.empty:
+        new_bars = pd.concat([existing, new_bars], ignore_index=True)
+    new_bars = new_bars.drop_duplicates(subset=["symbol", "day"], keep="last").sort_values(["symbol", "day"])
+
+    table = pa.Table.from_pandas(new_bars[BARS_SCHEMA.names], schema=BARS_SCHEMA, preserve_index=False)
+    ds.write_dataset(
+        table, BARS_DIR, format="parquet",
+        partitioning=BARS_PARTITIONING,
+        existing_data_behavior="delete_matching",
+        basename_template="part-{i}.parquet",
+    )
+    print(f"✅ {len(new_bars)} bars archived.")
+
+
+# --- קריאה אנליטית ---
+
+def _read(path, partitioning, columns, filters):
+    if not os.path.isdir(path):
+        return pd.DataFrame(columns=columns)
+    dataset = ds.dataset(path, format="parquet", partitioning=partitioning, filesystem=_filesystem)
+    return dataset.to_table(columns=columns, filter=filters).to_pandas()
+
+
+def _and(filters):
+    combined = None
+    for f in filters:
+        combined = f if combined is None else combined & f
+    return combined
+
+
+def read_quotes(columns, symbols=None, start_date: date = None, end_date: date = None):
+    """
+    קריאת עמודות נבחרות מהארכיון. המסננים על date/symbol גוזמים מחיצות שלמות.
+    """
+    columns = list(dict.fromkeys(["symbol", "timestamp"] + list(columns)))
+    filters = []
+    if symbols:
+        filters.append(pc.field("symbol").isin(list(symbols)))
+    if start_date:
+        filters.append(pc.field("date") >= start_date.isoformat())
+    if end_date:
+        filters.append(pc.field("date") <= end_date.isoformat())
+    return _read(QUOTES_DIR, QUOTES_PARTITIONING, columns, _and(filters))
+
+
+def read_bars(columns=None, symbols=None, years=None):
+    columns = list(columns) if columns else BARS_SCHEMA.names
+    filters = []
+    if symbols:
+        filters.append(pc.field("symbol").isin(list(symbols)))
+    if years:
+        filters.append(pc.field("year").isin([str(y) for y in years]))
+    return _read(BARS_DIR, BARS_PARTITIONING, columns, _and(filters))
+
+
+def read_latest_quotes(columns, symbols=None):
+    """
+    הציטוט האחרון של כל מניה בארכיון, גם אם לא צוטטה לאחרונה.
+    נקראת רק מחיצה אחת (היום האחרון) לכל סימול.
+    """
+    latest = _latest_archived_days()
+    if symbols:
+        wanted = set(symbols)
+        latest = {s: d for s, d in latest.items() if s in wanted}
+    if not latest:
+        return pd.DataFrame(columns=list(dict.fromkeys(["symbol", "timestamp"] + list(columns))))
+
+    read_columns = list(dict.fromkeys(["symbol", "timestamp", "date"] + list(columns)))
+    filters = _and([
+        pc.field("symbol").isin(list(latest.keys())),
+        pc.field("date").isin(sorted(set(latest.values()))),
+    ])
+    df = _read(QUOTES_DIR, QUOTES_PARTITIONING, read_columns, filters)
+
+    df = df[df["date"] == df["symbol"].map(latest)]
+    # שורה שלמה של הציטוט האחרון (groupby().last() מערבב עמודות מציטוטים שונים)
+    df = df.sort_values("timestamp").drop_duplicates(subset=["symbol"], keep="last")
+    if "date" not in columns:
+        df = df.drop(columns="date")
+    return df
+
+
+def pe_trend(symbols=None, start_date: date = None):
+    """מכפיל רווח (trailing/forward) יומי לכל מניה - הציטוט האחרון בכל יום"""
+    df = read_quotes(["trailingPE", "forwardPE"], symbols=symbols, start_date=start_date)
+    if df.empty:
+        return df
+    df["day"] = df["timestamp"].dt.date
+    return df.sort_values("timestamp").drop_duplicates(subset=["symbol", "day"], keep="last").reset_index(drop=True)
+
+
+def fifty_two_week_screen(near_low: float = None, near_high: float = None):
+    """
+    מיקום המחיר האחרון בטווח 52 השבועות, לכל הקטלוג (הציטוט האחרון של כל מניה).
+    range_position: 0 = בשפל השנתי, 1 = בשיא השנתי.
+    near_low / near_high: השארת מניות שנמצאות עד שבר זה מהטווח מהשפל / מהשיא.
+    """
+    df = read_latest_quotes(["currentPrice", "fiftyTwoWeekLow", "fiftyTwoWeekHigh"])
+    if df.empty:
+        return df
+
+    width = df["fiftyTwoWeekHigh"] - df["fiftyTwoWeekLow"]
+    df["range_position"] = (df["currentPrice"] - df["fiftyTwoWeekLow"]) / width.where(width > 0)
+
+    if near_low is not None:
+        df = df[df["range_position"] <= near_low]
+    if near_high is not None:
+        df = df[df["range_position"] >= 1 - near_high]
+    return df.sort_values("range_position").reset_index(drop=True)
+
+
+if __name__ == "__main__":
+    with SessionLocal() as db:
+        catalog = [s.symbol for s in db.query(models.Stock).all()]
+
+    export_quotes()
+    export_daily_bars(catalog)
+    print("🏁 Archive Complete.")
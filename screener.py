@@ -0,0 +1,153 @@
+import threading
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, select
+from database import engine
+import models
+import notifications
+
+# שדות מספריים שאפשר לסנן ולמיין לפיהם (מתוך הציטוט האחרון של כל מניה)
+NUMERIC_FIELDS = (
+    "currentPrice", "marketCap", "enterpriseValue", "volume", "averageVolume",
+    "trailingPE", "forwardPE", "pegRatio", "priceToBook", "profitMargins",
+    "dividendRate", "dividendYield", "totalRevenue", "revenueGrowth", "ebitda",
+    "fiftyTwoWeekHigh", "fiftyTwoWeekLow", "fiftyTwoWeekChange",
+    "fiftyDayAverage", "twoHundredDayAverage",
+)
+
+# שדות קטגוריים (סינון לפי התאמה)
+CATEGORY_FIELDS = ("sector", "industry", "country", "currency", "exchange", "quoteType", "recommendationKey")
+
+OPERATORS = ("<", "<=", ">", ">=", "==", "in")
+
+
+class ScreenerSnapshot:
+    """
+    תמונת מצב עמודתית של הציטוט האחרון לכל מניה, עם אינדקסים מחושבים מראש:
+    לכל שדה מספרי - הערכים ממוינים + סדר השורות (טווחים ב-searchsorted),
+    לכל שדה קטגורי - מיפוי ערך -> שורות.
+    """
+
+    def __init__(self, frame: pd.DataFrame):
+        self.frame = frame.reset_index(drop=True)
+        self.built_at = datetime.now()
+
+        self._sorted = {}
+        for field in NUMERIC_FIELDS:
+            values = pd.to_numeric(self.frame[field], errors="coerce").to_numpy(dtype=float)
+            valid = np.flatnonzero(~np.isnan(values))
+            order = valid[np.argsort(values[valid], kind="stable")]
+            self._sorted[field] = (values[order], order)
+
+        self._categories = {field: self.frame.groupby(field).indices for field in CATEGORY_FIELDS}
+
+    def __len__(self):
+        return len(self.frame)
+
+    def categories(self, field):
+        return sorted(self._categories[field].keys())
+
+    def _matches(self, field, op, value):
+        """מחזיר את מספרי השורות שעונות על תנאי אחד"""
+        if op not in OPERATORS:
+            raise ValueError(f"Unsupported operator: {op}")
+
+        if field in self._sorted:
+            values, order = self._sorted[field]
+            if op == "<":
+                return order[:np.searchsorted(values, value, side="left")]
+            if op == "<=":
+                return order[:np.searchsorted(values, value, side="right")]
+            if op == ">":
+                return order[np.searchsorted(values, value, side="right"):]
+            if op == ">=":
+                return order[np.searchsorted(values, value, side="left"):]
+            if op == "==":
+                return order[np.searchsorted(values, value, side="left"):np.searchsorted(values, value, side="right")]
+            raise ValueError(f"Operator {op} is not supported for {field}")
+
+        if field in self._categories:
+            index = self._categories[field]
+            if op == "==":
+                return index.get(value, np.array([], dtype=int))
+            if op == "in":
+                hits = [index[v] for v in value if v in index]
+                return np.concatenate(hits) if hits else np.array([], dtype=int)
+            raise ValueError(f"Operator {op} is not supported for {field}")
+
+        raise ValueError(f"Unknown screener field: {field}")
+
+    def screen(self, filters=(), sort_by: str = None, ascending: bool = True, limit: int = None):
+        """
+        filters: רשימת תנאים (field, op, value), למשל ("trailingPE", "<", 15).
+        כל התנאים חייבים להתקיים (AND).
+        """
+        mask = np.ones(len(self.frame), dtype=bool)
+        for field, op, value in filters:
+            hit = np.zeros(len(self.frame), dtype=bool)
+            hit[self._matches(field, op, value)] = True
+            mask &= hit
+
+        result = self.frame[mask]
+        if sort_by:
+            result = result.sort_values(sort_by, ascending=ascending, na_position="last")
+        if limit:
+            result = result.head(limit)
+        return result.reset_index(drop=True)
+
+
+def load_latest_quotes() -> pd.DataFrame:
+    """שאילתה אחת: הציטוט האחרון של כל מניה + נתוני המימד"""
+    latest = select(models.StockQuote.stock_id, func.max(models.StockQuote.timestamp).label("timestamp"))\
+        .group_by(models.StockQuote.stock_id)\
+        .subquery()
+
+    quote_columns = [getattr(models.StockQuote, f) for f in NUMERIC_FIELDS + ("recommendationKey", "timestamp")]
+    stock_columns = [getattr(models.Stock, f) for f in ("symbol", "shortName", "sector", "industry",
+                                                        "country", "currency", "exchange", "quoteType")]
+
+    query = select(*stock_columns, *quote_columns)\
+        .join(models.StockQuote, models.StockQuote.stock_id == models.Stock.id)\
+        .join(latest, (latest.c.stock_id == models.StockQuote.stock_id) & (latest.c.timestamp == models.StockQuote.timestamp))
+
+    df = pd.read_sql(query, engine)
+    # אותו timestamp פעמיים למניה - נשאיר שורה אחת
+    return df.drop_duplicates(subset=["symbol"], keep="last")
+
+
+# --- תמונת מצב משותפת לתהליך ---
+
+_snapshot = None
+_snapshot_lock = threading.Lock()
+
+
+def rebuild():
+    global _snapshot
+    snapshot = ScreenerSnapshot(load_latest_quotes())
+    with _snapshot_lock:
+        _snapshot = snapshot
+    print(f"🧮 Screener: snapshot rebuilt ({len(snapshot)} stocks).")
+    return snapshot
+
+
+def get_snapshot():
+    with _snapshot_lock:
+        snapshot = _snapshot
+    return snapshot if snapshot is not None else rebuild()
+
+
+def screen(filters=(), sort_by: str = None, ascending: bool = True, limit: int = None):
+    """סינון ודירוג כל הקטלוג מתוך תמונת המצב בזיכרון (ללא שאילתה ל-DB)"""
+    return get_snapshot().screen(filters, sort_by=sort_by, ascending=ascending, limit=limit)
+
+
+def _on_change(event):
+    # בונים מחדש רק כשהטעינה כולה הסתיימה, לא על כל ציטוט בודד.
+    # reset מגיע גם אחרי ניתוק של המאזין - ייתכן שפספסנו ingestion_complete
+    event_type = event.get("type")
+    if event_type == "ingestion_complete" or (event_type == "reset" and _snapshot is not None):
+        rebuild()
+
+
+notifications.subscribe(_on_change)